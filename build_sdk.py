@@ -13,17 +13,27 @@ than in make.
 
 """
 from argparse import ArgumentParser
-from os import popen, system, environ
-from shutil import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from os import chmod, environ, cpu_count, fsdecode, link, lstat, readlink, replace, scandir, stat, stat_result, DirEntry
+from os.path import relpath, samefile
+from shutil import copyfile, copytree, which
+from subprocess import run, Popen, DEVNULL, PIPE
 from pathlib import Path
 from dataclasses import dataclass
 from sys import executable
-from tarfile import open as tar_open, TarInfo
+from threading import Event
+from tarfile import open as tar_open, TarFile, TarInfo, DIRTYPE
+from stat import S_IMODE, S_ISDIR, S_ISREG
+from gzip import GzipFile
 import platform as host_platform
 from enum import IntEnum
+from functools import cached_property, lru_cache
+from hashlib import blake2b
+from importlib import import_module
 import json
 
-from typing import Any, Dict, Union, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterator, Union, List, Tuple, Optional, Protocol
 
 NAME = "microkit"
 VERSION = "1.4.1"
@@ -32,9 +42,54 @@ ENV_BIN_DIR = Path(executable).parent
 
 MICROKIT_EPOCH = 1616367257
 
+# Records the inputs that the outputs of a board and config were last built from
+BUILD_STAMP = ".sdkstamp"
+CONFIGURE_STAMP = ".configstamp"
+# The directories of the seL4 install that hold the headers for the SDK
+SEL4_INCLUDE_DIRS = ("kernel_Config", "libsel4", "libsel4/sel4_Config", "libsel4/autoconf")
+
+# Copying a file is dominated by system call latency rather than bandwidth,
+# so many copies are done at once.
+COPY_WORKERS = 32
+
+# Size of the chunks file data is copied into tarballs with
+TAR_COPY_BUFSIZE = 1024 * 1024
+
+# The file name suffix of the tarballs for each --compression choice
+TAR_SUFFIXES = {
+    "gzip": ".tar.gz",
+    "zstd": ".tar.zst",
+    "none": ".tar",
+}
+
 TOOLCHAIN_AARCH64 = "aarch64-none-elf"
 TOOLCHAIN_RISCV = "riscv64-unknown-elf"
 
+
+class Digest(Protocol):
+    def update(self, data: bytes) -> None:
+        ...
+
+    def hexdigest(self) -> str:
+        ...
+
+
+# blake3 hashes file contents considerably faster than hashlib, so the build
+# stamps use it when it is installed.
+BLAKE3: Optional[Callable[[bytes], Digest]]
+try:
+    BLAKE3 = import_module("blake3").blake3
+except ImportError:
+    BLAKE3 = None
+
+
+def new_digest(data: bytes = b"") -> Digest:
+    """Start a digest for a build stamp, seeded with data."""
+    if BLAKE3 is not None:
+        return BLAKE3(data)
+    return blake2b(data)
+
+
 KERNEL_CONFIG_TYPE = Union[bool, str]
 KERNEL_OPTIONS = Dict[str, Union[bool, str]]
 
@@ -66,7 +121,7 @@ class KernelArch(IntEnum):
             raise Exception(f"Unsupported arch {self}")
 
 
-@dataclass
+@dataclass(frozen=True)
 class BoardInfo:
     name: str
     arch: KernelArch
@@ -74,9 +129,27 @@ class BoardInfo:
     loader_link_address: int
     kernel_options: KERNEL_OPTIONS
 
+    @cached_property
+    def make_vars(self) -> Dict[str, str]:
+        """The variables passed to make for every component built for this board."""
+        make_vars = {
+            "ARCH": self.arch.to_str(),
+            "BOARD": self.name,
+        }
+        if self.gcc_cpu is not None:
+            make_vars["GCC_CPU"] = self.gcc_cpu
+        return make_vars
 
-@dataclass
+    @cached_property
+    def loader_defines(self) -> Tuple[Tuple[str, str], ...]:
+        """The variables passed to make for the loader that only depend on the board."""
+        return (("LINK_ADDRESS", hex(self.loader_link_address)),)
+
+
+@dataclass(frozen=True)
 class ConfigInfo:
+    __slots__ = ("name", "debug", "kernel_options")
+
     name: str
     debug: bool
     kernel_options: KERNEL_OPTIONS
@@ -272,6 +345,25 @@ SUPPORTED_CONFIGS = (
 )
 
 
+@lru_cache(maxsize=None)
+def sel4_config_args(board_name: str, config_name: str) -> Tuple[str, ...]:
+    """The CMake -D arguments that configure seL4 for a board and configuration."""
+    board = next(board for board in SUPPORTED_BOARDS if board.name == board_name)
+    config = next(config for config in SUPPORTED_CONFIGS if config.name == config_name)
+    # The options are passed in the order they are declared in, with options
+    # from the config taking precedence over those from the board.
+    kernel_options = {**board.kernel_options, **config.kernel_options}
+    config_strs = []
+    for arg, val in kernel_options.items():
+        if isinstance(val, bool):
+            str_val = "ON" if val else "OFF"
+        else:
+            str_val = str(val)
+        s = f"-D{arg}={str_val}"
+        config_strs.append(s)
+    return tuple(config_strs)
+
+
 EXAMPLES = {
     "hello": Path("example/hello"),
     "ethernet": Path("example/ethernet"),
@@ -281,8 +373,13 @@ EXAMPLES = {
 }
 
 
+# TarInfo only reads pax_headers when writing, so every entry can share one
+# empty dict
+TAR_PAX_HEADERS: Dict[str, str] = {}
+
+
 def tar_filter(tarinfo: TarInfo) -> TarInfo:
-    """This is used to change the tarinfo when created the .tar.gz archive.
+    """This is used to change the tarinfo when creating the tarballs.
 
     This ensures the tar file does not leak information from the build environment.
     """
@@ -290,21 +387,424 @@ def tar_filter(tarinfo: TarInfo) -> TarInfo:
     tarinfo.uid = tarinfo.gid = 0
     tarinfo.uname = tarinfo.gname = "microkit"
     # This is unlikely to be set, but force it anyway
-    tarinfo.pax_headers = {}
+    tarinfo.pax_headers = TAR_PAX_HEADERS
     tarinfo.mtime = MICROKIT_EPOCH
     assert tarinfo.isfile() or tarinfo.isdir()
     # Set the permissions properly
     if tarinfo.isdir():
-        tarinfo.mode = tarinfo.mode & ~0o777 | 0o744
-    if tarinfo.isfile():
-        if "/bin/" in tarinfo.name:
-            # Assume everything in bin should be executable.
-            tarinfo.mode = tarinfo.mode & ~0o777 | 0o755
-        else:
-            tarinfo.mode = tarinfo.mode & ~0o777 | 0o644
+        tarinfo.mode = 0o744
+    elif "/bin/" in tarinfo.name:
+        # Assume everything in bin should be executable.
+        tarinfo.mode = 0o755
+    else:
+        tarinfo.mode = 0o644
     return tarinfo
 
 
+def set_copy_buffer(tar: TarFile) -> None:
+    """Have tar copy file data through a TAR_COPY_BUFSIZE buffer.
+
+    copybufsize is missing from the type stubs of tarfile.open, so it is set
+    once the archive is open, before anything is added to it.
+    """
+    setattr(tar, "copybufsize", TAR_COPY_BUFSIZE)
+
+
+@contextmanager
+def tar_write_open(tar_file: Path, compression: str, threads: int) -> Iterator[TarFile]:
+    """Open a tar archive for writing as a stream, compressed as given.
+
+    gzip compression is done by pigz when it is available, and zstd
+    compression by zstd, so that it is spread across `threads` CPUs rather
+    than done on a single Python thread.
+    """
+    if compression == "none":
+        with open(tar_file, "wb", buffering=TAR_COPY_BUFSIZE) as f, \
+                tar_open(fileobj=f, mode="w|", bufsize=TAR_COPY_BUFSIZE) as tar:
+            set_copy_buffer(tar)
+            yield tar
+        return
+
+    if compression == "zstd":
+        zstd = which("zstd")
+        if zstd is None:
+            raise Exception("Error compressing with zstd: zstd is not installed")
+        # Long distance matching finds the data shared between the ELFs of
+        # different boards and configurations
+        cmd = [zstd, "-q", "-19", "--long=27", f"-T{threads}"]
+    else:
+        pigz = which("pigz")
+        if pigz is None:
+            # The file name and timestamp are kept out of the gzip header, as
+            # pigz -n does. Level 6 is gzip's default and much faster than the
+            # level 9 tarfile would use.
+            with open(tar_file, "wb", buffering=TAR_COPY_BUFSIZE) as f, \
+                    GzipFile(filename="", mode="wb", compresslevel=6, fileobj=f, mtime=MICROKIT_EPOCH) as gz, \
+                    tar_open(fileobj=gz, mode="w|", bufsize=TAR_COPY_BUFSIZE) as tar:
+                set_copy_buffer(tar)
+                yield tar
+            return
+        # -n keeps the file name and timestamp out of the gzip header
+        cmd = [pigz, "-n", "-p", str(threads)]
+
+    with open(tar_file, "wb") as f, Popen(cmd, stdin=PIPE, stdout=f) as process:
+        assert process.stdin is not None
+        with tar_open(fileobj=process.stdin, mode="w|", bufsize=TAR_COPY_BUFSIZE) as tar:
+            set_copy_buffer(tar)
+            yield tar
+    if process.returncode != 0:
+        raise Exception(f"Error compressing {tar_file}: cmd={cmd}")
+
+
+def walk_files(root: str) -> Iterator["DirEntry[str]"]:
+    """Yield an entry for every regular file and symbolic link under root.
+
+    Symbolic links are not followed, and other kinds of file such as FIFOs
+    and sockets are skipped. The file type comes from the directory listing
+    itself, so unlike Path.rglob and Path.is_file no stat is needed per entry.
+    """
+    with scandir(root) as it:
+        entries = list(it)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from walk_files(entry.path)
+        elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+            yield entry
+
+
+def up_to_date_copy(source: Union[str, Path], dest: Union[str, Path]) -> bool:
+    """Whether dest is already a copy of source.
+
+    copyfile does not copy the modification time, so dest is taken to be a
+    copy when it is the same size as source and was written after source
+    was last modified.
+    """
+    try:
+        dest_stat = stat(dest)
+    except FileNotFoundError:
+        return False
+    source_stat = stat(source)
+    return dest_stat.st_size == source_stat.st_size and dest_stat.st_mtime_ns >= source_stat.st_mtime_ns
+
+
+def copy_if_changed(source: Union[str, Path], dest: Union[str, Path]) -> bool:
+    """Copy source to dest, unless dest is already a copy of it.
+
+    Returns whether dest was written.
+    """
+    if up_to_date_copy(source, dest):
+        return False
+    copyfile(source, dest)
+    return True
+
+
+def copy_tree(source_dir: Path, dest_dir: Path, build_outputs: bool = False) -> None:
+    """Copy all files under source_dir into dest_dir, overwriting existing files.
+
+    copytree walks the tree and creates the directories, while the files it
+    finds are copied concurrently. File metadata is not copied, each file is
+    made read-only by the worker that copied it.
+
+    When build_outputs is set the files are hard linked where possible, see
+    link_or_copy. Otherwise files that were already copied are skipped, see
+    copy_if_changed.
+    """
+    def copy_read_only(source: str, dest: str) -> None:
+        if build_outputs:
+            # The mode is always set, as installing a build output again
+            # may have reset the mode of the file that dest links to
+            link_or_copy(source, dest)
+        elif not copy_if_changed(source, dest):
+            # dest was made read-only when it was copied
+            return
+        # Make output read-only
+        chmod(dest, 0o744)
+
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        futures = []
+
+        def copy_file(source: str, dest: str) -> None:
+            futures.append(executor.submit(copy_read_only, source, dest))
+
+        copytree(source_dir, dest_dir, copy_function=copy_file, dirs_exist_ok=True)
+        # Consume the results so that any copy error is raised
+        for future in futures:
+            future.result()
+
+
+def link_or_copy(build_output: Union[str, Path], dest: Union[str, Path]) -> None:
+    """Place a build output at dest, replacing any existing file.
+
+    A hard link is used when possible so that the data is not copied at all.
+    The file at dest shares its permissions with the build output, so this
+    must not be used for files that are part of the source tree.
+    """
+    try:
+        link(build_output, dest)
+    except FileExistsError:
+        # dest may be a link to a previous build output, so it is replaced
+        # rather than written through. It is renamed over from a temporary
+        # name so that dest is never missing. Nothing is done when dest is
+        # already the build output, or a copy of it made because the build
+        # output could not be linked.
+        if not samefile(build_output, dest) and not up_to_date_copy(build_output, dest):
+            tmp = f"{dest}.tmp"
+            Path(tmp).unlink(missing_ok=True)
+            link_or_copy(build_output, tmp)
+            replace(tmp, dest)
+    except OSError:
+        copyfile(build_output, dest)
+
+
+def publish(build_output: Path, dest: Path) -> None:
+    """Place a build output into the SDK and make it read-only."""
+    link_or_copy(build_output, dest)
+    dest.chmod(0o744)
+
+
+@lru_cache(maxsize=None)
+def tracked_files() -> Optional[Tuple[str, ...]]:
+    """The files tracked by git, sorted by path.
+
+    None is returned when the working directory is not a git checkout,
+    e.g. when building from the source tarball.
+    """
+    r = run(["git", "ls-files", "-z"], stdout=PIPE, stderr=DEVNULL)
+    if r.returncode != 0:
+        return None
+    return tuple(fsdecode(filename) for filename in r.stdout.split(b"\x00") if filename)
+
+
+def hash_files(digest: Digest, filenames: Tuple[str, ...], directory: str) -> None:
+    """Add the path, size and modification time of every file in directory to digest.
+
+    Every file is added when directory is empty.
+    """
+    prefix = f"{directory}/" if directory else ""
+    for filename in filenames:
+        if not filename.startswith(prefix):
+            continue
+        try:
+            st = stat(filename)
+        except FileNotFoundError:
+            digest.update(f"{filename} deleted\n".encode())
+        else:
+            digest.update(f"{filename} {st.st_size} {st.st_mtime_ns}\n".encode())
+
+
+def stamp_matches(stamp_path: Path, stamp: Optional[str]) -> bool:
+    """Check whether stamp_path records stamp.
+
+    stamp is None when the inputs could not be fingerprinted, which never matches.
+    """
+    return stamp is not None and stamp_path.exists() and stamp_path.read_text() == stamp
+
+
+def hash_build_script(digest: Digest) -> None:
+    """Add the size and modification time of this script to digest."""
+    st = Path(__file__).stat()
+    digest.update(f"{st.st_size} {st.st_mtime_ns}".encode())
+
+
+def sel4_revision(sel4_dir: Path) -> Optional[str]:
+    """Describe the source that sel4_dir has checked out.
+
+    This is the commit, followed by the size and modification time of every
+    file with local changes, so that work on seL4 itself can be built
+    incrementally too. None is returned when sel4_dir is not the top of a
+    git checkout.
+    """
+    head = run(["git", "-C", str(sel4_dir), "rev-parse", "--show-toplevel", "HEAD"], stdout=PIPE, stderr=DEVNULL, text=True)
+    if head.returncode != 0:
+        return None
+    toplevel, commit = head.stdout.splitlines()
+    # git also succeeds in a directory inside some other checkout, whose
+    # commit says nothing about the seL4 source. The paths given by git
+    # status are also relative to the top of the checkout.
+    if not samefile(toplevel, sel4_dir):
+        return None
+    revision = [commit]
+    status = run(
+        ["git", "-C", str(sel4_dir), "status", "--porcelain", "-z", "--untracked-files=all"],
+        stdout=PIPE, stderr=DEVNULL
+    )
+    if status.returncode != 0:
+        return None
+    records = iter(status.stdout.split(b"\x00"))
+    for record in records:
+        if not record:
+            continue
+        if record[:1] in (b"R", b"C"):
+            # A rename or copy is followed by its original path, which
+            # shows up as a deletion
+            revision.append(f"{fsdecode(next(records))} deleted")
+        filename = fsdecode(record[3:])
+        try:
+            st = stat(sel4_dir / filename)
+        except FileNotFoundError:
+            revision.append(f"{filename} deleted")
+        else:
+            revision.append(f"{filename} {st.st_size} {st.st_mtime_ns}")
+    return "\n".join(revision)
+
+
+def build_inputs_fingerprint(sel4_dir: Path) -> Optional[str]:
+    """Fingerprint the inputs shared by every board and config build.
+
+    None is returned when the inputs cannot be reliably fingerprinted.
+    """
+    revision = sel4_revision(sel4_dir)
+    filenames = tracked_files()
+    if revision is None or filenames is None:
+        return None
+    digest = new_digest(revision.encode())
+    for component in ("loader", "monitor", "libmicrokit"):
+        hash_files(digest, filenames, component)
+    hash_build_script(digest)
+    return digest.hexdigest()
+
+
+def tar_add_file(tar: TarFile, name: str, arcname: str, st: Optional[stat_result] = None) -> None:
+    """Add a single file or directory to tar, with its metadata set by tar_filter.
+
+    This does the same as TarFile.add without recursing, but the header of a
+    file or directory is built straight from its stat. This skips looking up
+    the names of the owner and group, which tar_filter replaces anyway. The
+    file is read through a buffer as large as the one the data is copied into
+    the tarball with. st is the lstat of name, if the caller already has it.
+    """
+    if st is None:
+        st = lstat(name)
+    if S_ISREG(st.st_mode) or S_ISDIR(st.st_mode):
+        tarinfo = TarInfo(arcname)
+        tarinfo.mode = S_IMODE(st.st_mode)
+        if S_ISDIR(st.st_mode):
+            tarinfo.type = DIRTYPE
+        else:
+            tarinfo.size = st.st_size
+    else:
+        tarinfo = tar.gettarinfo(name, arcname)
+    tarinfo = tar_filter(tarinfo)
+    if tarinfo.isreg():
+        with open(name, "rb", buffering=TAR_COPY_BUFSIZE) as f:
+            tar.addfile(tarinfo, f)
+    else:
+        tar.addfile(tarinfo)
+
+
+def tar_tree_entries(name: str, arcname: str) -> List[Tuple[str, str, stat_result]]:
+    """List a directory and everything under it, in the same order as TarFile.add.
+
+    Each entry is the path, its name in the tarball and its lstat, so that the
+    tree is only walked once to both fingerprint it and add it to a tarball.
+    """
+    entries = [(name, arcname, lstat(name))]
+    with scandir(name) as it:
+        children = sorted(it, key=lambda entry: entry.name)
+    for entry in children:
+        entry_arcname = f"{arcname}/{entry.name}"
+        if entry.is_dir(follow_symlinks=False):
+            entries += tar_tree_entries(entry.path, entry_arcname)
+        else:
+            entries.append((entry.path, entry_arcname, entry.stat(follow_symlinks=False)))
+    return entries
+
+
+def tar_up_to_date(tar_file: Path, stamp_path: Path, stamp: str) -> bool:
+    """Check whether tar_file was written from inputs with the fingerprint stamp."""
+    if tar_file.exists() and stamp_path.exists() and stamp_path.read_text() == stamp:
+        print(f"Skipping {tar_file}, it is up to date")
+        return True
+    stamp_path.unlink(missing_ok=True)
+    return False
+
+
+def build_sdk_tar(root_dir: Path, tar_file: Path, compression: str, threads: int, stamp_path: Path) -> None:
+    """Write the SDK tarball, unless it was already written from the same files.
+
+    The entries are written with fixed metadata, so only the files' contents
+    need fingerprinting, which their sizes and modification times stand in for.
+    """
+    entries = tar_tree_entries(str(root_dir), root_dir.name)
+    digest = new_digest(f"{tar_file} {compression}\n".encode())
+    hash_build_script(digest)
+    for name, _, st in entries:
+        if S_ISDIR(st.st_mode):
+            digest.update(f"{name}/\n".encode())
+        else:
+            digest.update(f"{name} {st.st_size} {st.st_mtime_ns}\n".encode())
+    stamp = digest.hexdigest()
+    if tar_up_to_date(tar_file, stamp_path, stamp):
+        return
+    with tar_write_open(tar_file, compression, threads) as tar:
+        for name, arcname, st in entries:
+            tar_add_file(tar, name, arcname, st)
+    stamp_path.write_text(stamp)
+
+
+def build_source_tar(
+    source_prefix: Path,
+    source_tar_file: Path,
+    compression: str,
+    threads: int,
+    stamp_path: Path,
+    cancelled: Event,
+) -> None:
+    """Write the source tarball, unless it was already written from the same files.
+
+    It is written in the background, so it stops early once cancelled is set.
+    """
+    # Add the files as git lists them. git lists them sorted by path,
+    # so related files are next to each other.
+    filenames = tracked_files()
+    if filenames is None:
+        raise Exception("Error listing source files: cmd=git ls-files")
+    digest = new_digest(f"{source_tar_file} {source_prefix} {compression}\n".encode())
+    hash_build_script(digest)
+    hash_files(digest, filenames, "")
+    stamp = digest.hexdigest()
+    if tar_up_to_date(source_tar_file, stamp_path, stamp):
+        return
+    with tar_write_open(source_tar_file, compression, threads) as tar:
+        for filename in filenames:
+            if cancelled.is_set():
+                break
+            tar_add_file(tar, filename, str(source_prefix / filename))
+    if cancelled.is_set():
+        # The tarball is incomplete
+        source_tar_file.unlink(missing_ok=True)
+        return
+    stamp_path.write_text(stamp)
+
+
+@lru_cache(maxsize=None)
+def absolute_path(path: Path) -> str:
+    """Return path made absolute, as a string.
+
+    The working directory does not change during a build, so the result
+    can be cached rather than calling getcwd for every command.
+    """
+    return str(path.absolute())
+
+
+@lru_cache(maxsize=None)
+def compiler_launcher() -> Optional[str]:
+    """Find a compiler cache to wrap the C compiler with, if one is installed."""
+    return which("ccache") or which("sccache")
+
+
+def compiler_env() -> Dict[str, str]:
+    """Return the environment to run a compiling build step in.
+
+    Let ccache hits survive the build directory moving, and check the
+    cross compiler by its contents as its mtime says little about it.
+    """
+    env = environ.copy()
+    env.setdefault("CCACHE_BASEDIR", str(Path.cwd()))
+    env.setdefault("CCACHE_COMPILERCHECK", "content")
+    return env
+
+
 def get_tool_target_triple() -> str:
     host_system = host_platform.system()
     if host_system == "Linux":
@@ -321,22 +821,31 @@ def get_tool_target_triple() -> str:
         raise Exception(f"The platform \"{host_system}\" is not supported")
 
 
-def test_tool() -> None:
-    r = system(
-        f"cd tool/microkit && cargo test"
-    )
-    assert r == 0
+TOOL_TEST_CMD = ["cargo", "test"]
+
+
+def start_tool_tests() -> "Popen[bytes]":
+    """Start running the tool's tests in the background.
+
+    finish_tool_tests waits for them.
+    """
+    return Popen(TOOL_TEST_CMD, cwd="tool/microkit")
+
+
+def finish_tool_tests(process: "Popen[bytes]") -> None:
+    if process.wait() != 0:
+        raise Exception(f"Error testing tool: cmd={' '.join(TOOL_TEST_CMD)}")
 
 
 def build_tool(tool_target: Path, target_triple: str) -> None:
-    r = system(
-        f"cd tool/microkit && cargo build --release --target {target_triple}"
-    )
-    assert r == 0
+    cmd = ["cargo", "build", "--release", "--target", target_triple]
+    r = run(cmd, cwd="tool/microkit")
+    if r.returncode != 0:
+        raise Exception(f"Error building tool: cmd={cmd}")
 
     tool_output = f"./tool/microkit/target/{target_triple}/release/microkit"
 
-    copy(tool_output, tool_target)
+    copyfile(tool_output, tool_target)
 
     tool_target.chmod(0o755)
 
@@ -347,8 +856,14 @@ def build_sel4(
     build_dir: Path,
     board: BoardInfo,
     config: ConfigInfo,
-) -> Dict[str, Any]:
-    """Build seL4"""
+    toolchain: str,
+    jobs: int,
+    max_load: int,
+) -> None:
+    """Build seL4 using at most `jobs` parallel compile jobs.
+
+    No new compile jobs are started while the load average is above max_load.
+    """
     build_dir = build_dir / board.name / config.name / "sel4"
     build_dir.mkdir(exist_ok=True, parents=True)
 
@@ -360,118 +875,196 @@ def build_sel4(
 
     print(f"Building sel4: {sel4_dir=} {root_dir=} {build_dir=} {board=} {config=}")
 
-    config_args = list(board.kernel_options.items()) + list(config.kernel_options.items())
-    config_strs = []
-    for arg, val in sorted(config_args):
-        if isinstance(val, bool):
-            str_val = "ON" if val else "OFF"
-        else:
-            str_val = str(val)
-        s = f"-D{arg}={str_val}"
-        config_strs.append(s)
-    config_str = " ".join(config_strs)
-
-    toolchain = f"{board.arch.c_toolchain()}-"
-    cmd = (
-        f"cmake -GNinja -DCMAKE_INSTALL_PREFIX={sel4_install_dir.absolute()} "
-        f" -DPYTHON3={executable} "
-        f" -DCROSS_COMPILER_PREFIX={toolchain}"
-        f" {config_str} "
-        f"-S {sel4_dir.absolute()} -B {sel4_build_dir.absolute()}")
-
-    r = system(cmd)
-    if r != 0:
-        raise Exception(f"Error configuring sel4: cmd={cmd}")
-
-    cmd = f"cmake --build {sel4_build_dir.absolute()}"
-    r = system(cmd)
-    if r != 0:
+    sel4_install_abs = absolute_path(sel4_install_dir)
+    sel4_build_abs = absolute_path(sel4_build_dir)
+
+    cmd = [
+        "cmake", "-GNinja",
+        f"-DCMAKE_INSTALL_PREFIX={sel4_install_abs}",
+        f"-DPYTHON3={executable}",
+        f"-DCROSS_COMPILER_PREFIX={toolchain}",
+        *sel4_config_args(board.name, config.name),
+        "-S", absolute_path(sel4_dir),
+        "-B", sel4_build_abs,
+    ]
+    # The kernel sources are the same for every board and config, so let
+    # ccache (or sccache) reuse objects across builds when it is available. The launcher
+    # is always passed so that an existing build directory stops using
+    # compiler cache if it is removed.
+    cmd.append(f"-DCMAKE_C_COMPILER_LAUNCHER={compiler_launcher() or ''}")
+    # Configuring is slow and only needs to be redone when the configure
+    # command changes. Otherwise ninja reruns CMake itself if any of the
+    # CMake files change.
+    configure_stamp = sel4_build_dir / CONFIGURE_STAMP
+    configure_args = "\n".join(cmd)
+    configured = (sel4_build_dir / "build.ninja").exists() and configure_stamp.exists()
+    if not configured or configure_stamp.read_text() != configure_args:
+        configure_stamp.unlink(missing_ok=True)
+        r = run(cmd)
+        if r.returncode != 0:
+            raise Exception(f"Error configuring sel4: cmd={cmd}")
+        configure_stamp.write_text(configure_args)
+
+    env = compiler_env()
+    # Building the install target builds and installs in a single ninja run
+    cmd = ["ninja", "-C", sel4_build_abs, "-j", str(jobs), "-l", str(max_load), "install"]
+    r = run(cmd, env=env)
+    if r.returncode != 0:
         raise Exception(f"Error building sel4: cmd={cmd}")
 
-    cmd = f"cmake --install {sel4_build_dir.absolute()}"
-    r = system(cmd)
-    if r != 0:
-        raise Exception(f"Error installing sel4: cmd={cmd}")
-
     elf = sel4_install_dir / "bin" / "kernel.elf"
     dest = (
         root_dir / "board" / board.name / config.name / "elf" / "sel4.elf"
     )
-    dest.unlink(missing_ok=True)
-    copy(elf, dest)
-    # Make output read-only
-    dest.chmod(0o744)
+    publish(elf, dest)
 
     invocations_all = sel4_build_dir / "generated" / "invocations_all.json"
     dest = (root_dir / "board" / board.name / config.name / "invocations_all.json")
-    dest.unlink(missing_ok=True)
-    copy(invocations_all, dest)
-    dest.chmod(0o744)
+    publish(invocations_all, dest)
 
     include_dir = root_dir / "board" / board.name / config.name / "include"
-    for source in ("kernel_Config", "libsel4", "libsel4/sel4_Config", "libsel4/autoconf"):
-        source_dir = sel4_install_dir / source / "include"
-        for p in source_dir.rglob("*"):
-            if not p.is_file():
-                continue
-            rel = p.relative_to(source_dir)
-            dest = include_dir / rel
-            dest.parent.mkdir(exist_ok=True, parents=True)
-            dest.unlink(missing_ok=True)
-            copy(p, dest)
-            dest.chmod(0o744)
+    for source in SEL4_INCLUDE_DIRS:
+        copy_tree(sel4_install_dir / source / "include", include_dir, build_outputs=True)
+
 
+def load_sel4_gen_config(build_dir: Path, board: BoardInfo, config: ConfigInfo) -> Dict[str, Any]:
+    """Load the kernel configuration generated by the seL4 build for board and config."""
+    sel4_install_dir = build_dir / board.name / config.name / "sel4" / "install"
     gen_config_path = sel4_install_dir / "libsel4/include/kernel/gen_config.json"
+    if not gen_config_path.exists():
+        raise Exception(f"Error loading seL4 config, has seL4 been built for {board.name} {config.name}?: path={gen_config_path}")
     with open(gen_config_path, "r") as f:
         gen_config = json.load(f)
         return gen_config
 
 
+def component_fingerprint(
+    component_name: str,
+    make_vars: Dict[str, str],
+    sel4_install_dir: Path,
+) -> Optional[str]:
+    """Fingerprint the inputs of a component build.
+
+    The inputs are the component's source, the variables passed to make and
+    the seL4 headers it is built against. None is returned when the inputs
+    cannot be reliably fingerprinted.
+    """
+    filenames = tracked_files()
+    sel4_include_dirs = [sel4_install_dir / source / "include" for source in SEL4_INCLUDE_DIRS]
+    if filenames is None or not all(include_dir.is_dir() for include_dir in sel4_include_dirs):
+        return None
+    digest = new_digest(repr(sorted(make_vars.items())).encode())
+    hash_files(digest, filenames, component_name)
+    # The headers are rewritten by every seL4 install, so they are compared
+    # by content rather than by modification time.
+    for include_dir in sel4_include_dirs:
+        for entry in sorted(walk_files(str(include_dir)), key=lambda entry: entry.path):
+            digest.update(f"{entry.path}\n".encode())
+            if entry.is_symlink():
+                # The link may dangle, so it is described by its target
+                digest.update(f"-> {readlink(entry.path)}\n".encode())
+                continue
+            with open(entry.path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def make_component(
+    component_name: str,
+    build_dir: Path,
+    output: Path,
+    make_vars: Dict[str, str],
+    sel4_install_dir: Path,
+    board: BoardInfo,
+    config: ConfigInfo,
+    jobs: int,
+    max_load: int,
+) -> None:
+    """Run make for a component, unless output was already built from the same inputs."""
+    stamp_path = build_dir / BUILD_STAMP
+    stamp = component_fingerprint(component_name, make_vars, sel4_install_dir)
+    if stamp is not None and output.exists() and stamp_path.exists() and stamp_path.read_text() == stamp:
+        print(f"Skipping build of {component_name} for {board.name} {config.name}, it is up to date")
+        return
+    stamp_path.unlink(missing_ok=True)
+
+    env = compiler_env()
+    env.update(make_vars)
+    # The launcher is left out of make_vars as it does not change the output
+    env["CC_LAUNCHER"] = compiler_launcher() or ""
+    env["MAKEFLAGS"] = f"-j{jobs} -l{max_load}"
+    r = run(["make", "-C", component_name], env=env)
+    if r.returncode != 0:
+        raise Exception(
+            f"Error building: {component_name} for board: {board.name} config: {config.name}"
+        )
+    if stamp is not None:
+        stamp_path.write_text(stamp)
+
+
+def component_make_vars(
+    root_dir: Path,
+    component_build_dir: Path,
+    board: BoardInfo,
+    config: ConfigInfo,
+    toolchain: str,
+) -> Dict[str, str]:
+    """The variables passed to make for every component of a board and config."""
+    make_vars = dict(board.make_vars)
+    make_vars["BUILD_DIR"] = absolute_path(component_build_dir)
+    make_vars["SEL4_SDK"] = absolute_path(root_dir / "board" / board.name / config.name)
+    make_vars["TOOLCHAIN"] = toolchain
+    return make_vars
+
+
 def build_elf_component(
     component_name: str,
     root_dir: Path,
     build_dir: Path,
     board: BoardInfo,
     config: ConfigInfo,
-    defines: List[Tuple[str, str]]
+    toolchain: str,
+    defines: List[Tuple[str, str]],
+    jobs: int,
+    max_load: int,
 ) -> None:
     """Build a specific ELF component.
 
     Right now this is either the loader or the monitor
     """
-    sel4_dir = root_dir / "board" / board.name / config.name
+    sel4_install_dir = build_dir / board.name / config.name / "sel4" / "install"
     build_dir = build_dir / board.name / config.name / component_name
     build_dir.mkdir(exist_ok=True, parents=True)
-    toolchain = f"{board.arch.c_toolchain()}-"
-    defines_str = " ".join(f"{k}={v}" for k, v in defines)
-    defines_str += f" ARCH={board.arch.to_str()} BOARD={board.name} BUILD_DIR={build_dir.absolute()} SEL4_SDK={sel4_dir.absolute()} TOOLCHAIN={toolchain}"
-
-    if board.gcc_cpu is not None:
-        defines_str += f" GCC_CPU={board.gcc_cpu}"
+    make_vars = {k: str(v) for k, v in defines}
+    make_vars.update(component_make_vars(root_dir, build_dir, board, config, toolchain))
 
-    r = system(
-        f"{defines_str} make -C {component_name}"
-    )
-    if r != 0:
-        raise Exception(
-            f"Error building: {component_name} for board: {board.name} config: {config.name}"
-        )
     elf = build_dir / f"{component_name}.elf"
+    make_component(component_name, build_dir, elf, make_vars, sel4_install_dir, board, config, jobs, max_load)
     dest = (
         root_dir / "board" / board.name / config.name / "elf" / f"{component_name}.elf"
     )
-    dest.unlink(missing_ok=True)
-    copy(elf, dest)
-    # Make output read-only
-    dest.chmod(0o744)
+    publish(elf, dest)
 
 
-def build_doc(root_dir: Path):
+def doc_build_cmd(root_dir: Path) -> List[str]:
     output = root_dir / "doc" / "microkit_user_manual.pdf"
+    return ["pandoc", "docs/manual.md", "-o", str(output)]
+
 
-    environ["TEXINPUTS"] = "docs/style:"
-    r = system(f'pandoc docs/manual.md -o {output}')
-    assert r == 0
+def start_doc_build(root_dir: Path) -> "Popen[bytes]":
+    """Start building the manual.
+
+    The manual does not depend on anything else in the SDK, so it is built
+    in the background. finish_doc_build waits for it.
+    """
+    env = environ.copy()
+    env["TEXINPUTS"] = "docs/style:"
+    return Popen(doc_build_cmd(root_dir), env=env)
+
+
+def finish_doc_build(process: "Popen[bytes]", root_dir: Path) -> None:
+    if process.wait() != 0:
+        raise Exception(f"Error building docs: cmd={' '.join(doc_build_cmd(root_dir))}")
 
 
 def build_lib_component(
@@ -480,54 +1073,119 @@ def build_lib_component(
     build_dir: Path,
     board: BoardInfo,
     config: ConfigInfo,
+    toolchain: str,
+    jobs: int,
+    max_load: int,
 ) -> None:
     """Build a specific library component.
 
     Right now this is just libsel4.a
     """
-    sel4_dir = root_dir / "board" / board.name / config.name
+    sel4_install_dir = build_dir / board.name / config.name / "sel4" / "install"
     build_dir = build_dir / board.name / config.name / component_name
     build_dir.mkdir(exist_ok=True, parents=True)
+    make_vars = component_make_vars(root_dir, build_dir, board, config, toolchain)
 
-    toolchain = f"{board.arch.c_toolchain()}-"
-    defines_str = f" ARCH={board.arch.to_str()} BUILD_DIR={build_dir.absolute()} SEL4_SDK={sel4_dir.absolute()} TOOLCHAIN={toolchain}"
-
-    if board.gcc_cpu is not None:
-        defines_str += f" GCC_CPU={board.gcc_cpu}"
-
-    r = system(
-        f"{defines_str} make -C {component_name}"
-    )
-    if r != 0:
-        raise Exception(
-            f"Error building: {component_name} for board: {board.name} config: {config.name}"
-        )
     lib = build_dir / f"{component_name}.a"
+    make_component(component_name, build_dir, lib, make_vars, sel4_install_dir, board, config, jobs, max_load)
     lib_dir = root_dir / "board" / board.name / config.name / "lib"
     dest = lib_dir / f"{component_name}.a"
-    dest.unlink(missing_ok=True)
-    copy(lib, dest)
-    # Make output read-only
-    dest.chmod(0o744)
+    publish(lib, dest)
 
     link_script = Path(component_name) / "microkit.ld"
     dest = lib_dir / "microkit.ld"
-    dest.unlink(missing_ok=True)
-    copy(link_script, dest)
-    # Make output read-only
-    dest.chmod(0o744)
+    if copy_if_changed(link_script, dest):
+        # Make output read-only
+        dest.chmod(0o744)
 
     include_dir = root_dir / "board" / board.name / config.name / "include"
-    source_dir = Path(component_name) / "include"
-    for p in source_dir.rglob("*"):
-        if not p.is_file():
-            continue
-        rel = p.relative_to(source_dir)
-        dest = include_dir / rel
-        dest.parent.mkdir(exist_ok=True, parents=True)
-        dest.unlink(missing_ok=True)
-        copy(p, dest)
-        dest.chmod(0o744)
+    copy_tree(Path(component_name) / "include", include_dir)
+
+
+def write_outputs_stamp(config_dir: Path, stamp_path: Path, stamp: str) -> None:
+    """Record stamp along with every file that has been published to config_dir."""
+    outputs = sorted(relpath(entry.path, config_dir) for entry in walk_files(str(config_dir)))
+    stamp_path.write_text("\n".join([stamp, *outputs]) + "\n")
+
+
+def outputs_up_to_date(config_dir: Path, stamp_path: Path, stamp: str) -> bool:
+    """Whether the outputs in config_dir were built from the inputs described by stamp.
+
+    Every output recorded by write_outputs_stamp must still be present.
+    """
+    if not stamp_path.exists():
+        return False
+    lines = stamp_path.read_text().splitlines()
+    if not lines:
+        return False
+    recorded_stamp, *outputs = lines
+    return recorded_stamp == stamp and all((config_dir / output).exists() for output in outputs)
+
+
+def build_board_config(
+    sel4_dir: Path,
+    root_dir: Path,
+    build_dir: Path,
+    board: BoardInfo,
+    config: ConfigInfo,
+    skip_sel4: bool,
+    jobs: int,
+    max_load: int,
+    inputs_fingerprint: Optional[str],
+    rebuild: bool,
+) -> None:
+    """Build seL4 and all the Microkit components for a board and configuration.
+
+    Each of the underlying builds is limited to `jobs` parallel compile jobs,
+    and starts no new jobs while the load average is above max_load.
+
+    When inputs_fingerprint is given the build is skipped if the SDK already
+    contains outputs built from the same inputs, unless rebuild is set.
+    """
+    config_dir = root_dir / "board" / board.name / config.name
+    # The same prefix is used for the kernel's CROSS_COMPILER_PREFIX and the
+    # components' TOOLCHAIN, so it is worked out once for all of them
+    toolchain = f"{board.arch.c_toolchain()}-"
+    stamp_path = build_dir / board.name / config.name / BUILD_STAMP
+    stamp = None
+    if inputs_fingerprint is not None:
+        digest = new_digest(inputs_fingerprint.encode())
+        digest.update(repr((board, config, toolchain, executable)).encode())
+        stamp = digest.hexdigest()
+        if not rebuild and outputs_up_to_date(config_dir, stamp_path, stamp):
+            print(f"Skipping build of {board.name} {config.name}, it is up to date")
+            return
+    stamp_path.unlink(missing_ok=True)
+
+    if not skip_sel4:
+        build_sel4(sel4_dir, root_dir, build_dir, board, config, toolchain, jobs, max_load)
+    # This is read from the install dir rather than returned by build_sel4,
+    # so that --skip-sel4 can use the configuration of an earlier build
+    sel4_gen_config = load_sel4_gen_config(build_dir, board, config)
+    loader_printing = 1 if config.name == "debug" else 0
+    loader_defines = [
+        *board.loader_defines,
+        ("PRINTING", str(loader_printing))
+    ]
+    # There are some architecture dependent configuration options that the loader
+    # needs to know about, so we figure that out here
+    if board.arch.is_riscv():
+        loader_defines.append(("FIRST_HART_ID", str(sel4_gen_config["FIRST_HART_ID"])))
+    if board.arch.is_arm():
+        if sel4_gen_config["ARM_PA_SIZE_BITS_40"]:
+            arm_pa_size_bits = 40
+        elif sel4_gen_config["ARM_PA_SIZE_BITS_44"]:
+            arm_pa_size_bits = 44
+        else:
+            raise Exception("Unexpected ARM physical address bits defines")
+        loader_defines.append(("PHYSICAL_ADDRESS_BITS", str(arm_pa_size_bits)))
+
+    build_elf_component("loader", root_dir, build_dir, board, config, toolchain, loader_defines, jobs, max_load)
+    build_elf_component("monitor", root_dir, build_dir, board, config, toolchain, [], jobs, max_load)
+    build_lib_component("libmicrokit", root_dir, build_dir, board, config, toolchain, jobs, max_load)
+
+    if stamp is not None:
+        write_outputs_stamp(config_dir, stamp_path, stamp)
 
 
 def main() -> None:
@@ -537,10 +1195,14 @@ def main() -> None:
     parser.add_argument("--boards", metavar="BOARDS", help="Comma-separated list of boards to support. When absent, all boards are supported.")
     parser.add_argument("--configs", metavar="CONFIGS", help="Comma-separated list of configurations to support. When absent, all configurations are supported.")
     parser.add_argument("--skip-tool", action="store_true", help="Tool will not be built")
+    parser.add_argument("--skip-tests", action="store_true", help="Tool tests will not be run")
     parser.add_argument("--skip-sel4", action="store_true", help="seL4 will not be built")
     parser.add_argument("--skip-docs", action="store_true", help="Docs will not be built")
     parser.add_argument("--skip-tar", action="store_true", help="SDK and source tarballs will not be built")
+    parser.add_argument("--compression", choices=TAR_SUFFIXES.keys(), default="gzip", help="Compression used for the SDK and source tarballs. zstd is faster to compress and decompress, gzip is the default for compatibility.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild every board and configuration, even those that are up to date")
     parser.add_argument("--version", default=VERSION, help="SDK version")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count() or 1, help="Number of parallel jobs shared by all of the builds. Defaults to the number of CPUs.")
     for arch in KernelArch:
         arch_str = arch.name.lower()
         parser.add_argument(f"--toolchain-prefix-{arch_str}", default=arch.c_toolchain(), help=f"C toolchain prefix when compiling for {arch_str}, e.g {arch_str}-none-elf")
@@ -578,9 +1240,26 @@ def main() -> None:
     if not sel4_dir.exists():
         raise Exception(f"sel4_dir: {sel4_dir} does not exist")
 
+    # The source tarball holds the files tracked by git, so check that they
+    # can be listed before spending any time on the builds
+    if not args.skip_tar and tracked_files() is None:
+        raise Exception("Error listing source files, the source tarball needs a git checkout: cmd=git ls-files")
+    if not args.skip_tar and args.compression == "zstd" and which("zstd") is None:
+        raise Exception("Compressing with zstd requires zstd to be installed")
+
+    build_dir = Path("build")
     root_dir = Path("release") / f"{NAME}-sdk-{version}"
-    tar_file = Path("release") / f"{NAME}-sdk-{version}.tar.gz"
-    source_tar_file = Path("release") / f"{NAME}-source-{version}.tar.gz"
+    tar_suffix = TAR_SUFFIXES[args.compression]
+    tar_file = Path("release") / f"{NAME}-sdk-{version}{tar_suffix}"
+    source_tar_file = Path("release") / f"{NAME}-source-{version}{tar_suffix}"
+    # The stamps record the inputs of the last tarballs, so that unchanged
+    # tarballs are not written again
+    tar_stamp = build_dir / "sdk.tarstamp"
+    source_tar_stamp = build_dir / "source.tarstamp"
+    build_dir.mkdir(exist_ok=True)
+    if args.rebuild:
+        tar_stamp.unlink(missing_ok=True)
+        source_tar_stamp.unlink(missing_ok=True)
     dir_structure = [
         root_dir / "bin",
         root_dir / "board",
@@ -602,84 +1281,148 @@ def main() -> None:
     for dr in dir_structure:
         dr.mkdir(exist_ok=True, parents=True)
 
-    with open(root_dir / "VERSION", "w+") as f:
-        f.write(version + "\n")
-
-    copy(Path("LICENSE.md"), root_dir)
-    licenses_dir = Path("LICENSES")
-    licenses_dest_dir = root_dir / "LICENSES"
-    for p in licenses_dir.rglob("*"):
-        if not p.is_file():
-            continue
-        rel = p.relative_to(licenses_dir)
-        dest = licenses_dest_dir / rel
-        dest.parent.mkdir(exist_ok=True, parents=True)
-        dest.unlink(missing_ok=True)
-        copy(p, dest)
-        dest.chmod(0o744)
-
-    if not args.skip_tool:
-        tool_target = root_dir / "bin" / "microkit"
-        test_tool()
-        build_tool(tool_target, args.tool_target_triple)
-
-    if not args.skip_docs:
-        build_doc(root_dir)
-
-    build_dir = Path("build")
-    for board in selected_boards:
-        for config in selected_configs:
-            if not args.skip_sel4:
-                sel4_gen_config = build_sel4(sel4_dir, root_dir, build_dir, board, config)
-            loader_printing = 1 if config.name == "debug" else 0
-            loader_defines = [
-                ("LINK_ADDRESS", hex(board.loader_link_address)),
-                ("PRINTING", loader_printing)
+    doc_build: Optional["Popen[bytes]"] = None
+    tool_tests: Optional["Popen[bytes]"] = None
+    tar_executor = ThreadPoolExecutor(max_workers=1)
+    source_tar_cancelled = Event()
+    try:
+        if not args.skip_docs:
+            # The manual only needs to be built again when its source has changed,
+            # which also keeps its modification time for the SDK tarball stamp
+            filenames = tracked_files()
+            doc_stamp = None
+            if filenames is not None:
+                doc_digest = new_digest()
+                hash_files(doc_digest, filenames, "docs")
+                doc_stamp = doc_digest.hexdigest()
+            doc_build_stamp = build_dir / "doc.buildstamp"
+            doc_built = (root_dir / "doc" / "microkit_user_manual.pdf").exists()
+            if not args.rebuild and doc_built and stamp_matches(doc_build_stamp, doc_stamp):
+                print("Skipping doc build, it is up to date")
+            else:
+                doc_build_stamp.unlink(missing_ok=True)
+                doc_build = start_doc_build(root_dir)
+
+        # The source tarball only needs the files tracked by git, so it is
+        # written in the background while the SDK is built. It runs alongside
+        # the builds, so it is given a single compression thread.
+        source_tar = None
+        if not args.skip_tar:
+            source_prefix = Path(f"{NAME}-source-{version}")
+            source_tar = tar_executor.submit(
+                build_source_tar, source_prefix, source_tar_file, args.compression, 1, source_tar_stamp, source_tar_cancelled
+            )
+
+        # VERSION is only written when it changes, so that its modification time
+        # does not make the SDK tarball look out of date
+        version_file = root_dir / "VERSION"
+        if not version_file.exists() or version_file.read_text() != version + "\n":
+            with open(version_file, "w+") as f:
+                f.write(version + "\n")
+
+        copy_if_changed(Path("LICENSE.md"), root_dir / "LICENSE.md")
+        licenses_dir = Path("LICENSES")
+        licenses_dest_dir = root_dir / "LICENSES"
+        copy_tree(licenses_dir, licenses_dest_dir)
+
+        if not args.skip_tool:
+            tool_target = root_dir / "bin" / "microkit"
+            # The tool only needs to be tested and built again when its source has changed
+            filenames = tracked_files()
+            tool_stamp = None
+            if filenames is not None:
+                tool_digest = new_digest()
+                hash_files(tool_digest, filenames, "tool/microkit")
+                tool_stamp = tool_digest.hexdigest()
+            tool_test_stamp = build_dir / "tool.teststamp"
+            run_tool_tests = False
+            if args.skip_tests:
+                pass
+            elif args.rebuild or not stamp_matches(tool_test_stamp, tool_stamp):
+                run_tool_tests = True
+                tool_test_stamp.unlink(missing_ok=True)
+            else:
+                print("Skipping tool tests, the tool has not changed since they last passed")
+
+            tool_build_stamp = build_dir / "tool.buildstamp"
+            tool_build = None if tool_stamp is None else f"{tool_stamp} {args.tool_target_triple}"
+            if not args.rebuild and tool_target.exists() and stamp_matches(tool_build_stamp, tool_build):
+                print("Skipping tool build, it is up to date")
+            else:
+                tool_build_stamp.unlink(missing_ok=True)
+                build_tool(tool_target, args.tool_target_triple)
+                if tool_build is not None:
+                    tool_build_stamp.write_text(tool_build)
+
+            if run_tool_tests:
+                # cargo test waits for cargo build to release the lock on the
+                # target directory, so the tests are started after the build.
+                # They then run alongside the board and config builds.
+                tool_tests = start_tool_tests()
+
+        build_pairs = [(board, config) for board in selected_boards for config in selected_configs]
+        # Each (board, config) pair builds into its own directories under both
+        # build_dir and root_dir, so the pairs can be built concurrently.
+        # The job budget is split between the pairs being built so that the
+        # ninja and make invocations underneath do not oversubscribe the host.
+        # They also hold back while the load average is above the whole budget,
+        # which catches the pigz, pandoc and cargo work running at the same time.
+        # That limit also allows the share to be rounded up, so that no CPU is
+        # left idle when the budget does not divide evenly between the pairs.
+        total_jobs = max(1, args.jobs)
+        workers = max(1, min(total_jobs, len(build_pairs)))
+        jobs = -(-total_jobs // workers)
+        # Builds can only be skipped when seL4 is being built, otherwise the
+        # kernel in the SDK is not known to match the rest of the outputs.
+        inputs_fingerprint = None if args.skip_sel4 else build_inputs_fingerprint(sel4_dir)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    build_board_config, sel4_dir, root_dir, build_dir, board, config,
+                    args.skip_sel4, jobs, total_jobs, inputs_fingerprint, args.rebuild
+                )
+                for board, config in build_pairs
             ]
-            # There are some architecture dependent configuration options that the loader
-            # needs to know about, so we figure that out here
-            if board.arch.is_riscv():
-                loader_defines.append(("FIRST_HART_ID", sel4_gen_config["FIRST_HART_ID"]))
-            if board.arch.is_arm():
-                if sel4_gen_config["ARM_PA_SIZE_BITS_40"]:
-                    arm_pa_size_bits = 40
-                elif sel4_gen_config["ARM_PA_SIZE_BITS_44"]:
-                    arm_pa_size_bits = 44
-                else:
-                    raise Exception("Unexpected ARM physical address bits defines")
-                loader_defines.append(("PHYSICAL_ADDRESS_BITS", arm_pa_size_bits))
-
-            build_elf_component("loader", root_dir, build_dir, board, config, loader_defines)
-            build_elf_component("monitor", root_dir, build_dir, board, config, [])
-            build_lib_component("libmicrokit", root_dir, build_dir, board, config)
-
-    # Setup the examples
-    for example, example_path in EXAMPLES.items():
-        include_dir = root_dir / "example" / example
-        source_dir = example_path
-        for p in source_dir.rglob("*"):
-            if not p.is_file():
-                continue
-            rel = p.relative_to(source_dir)
-            dest = include_dir / rel
-            dest.parent.mkdir(exist_ok=True, parents=True)
-            dest.unlink(missing_ok=True)
-            copy(p, dest)
-            dest.chmod(0o744)
-
-    if not args.skip_tar:
-        # At this point we create a tar.gz file
-        with tar_open(tar_file, "w:gz") as tar:
-            tar.add(root_dir, arcname=root_dir.name, filter=tar_filter)
-
-        # Build the source tar
-        process = popen("git ls-files")
-        filenames = [Path(fn.strip()) for fn in process.readlines()]
-        process.close()
-        source_prefix = Path(f"{NAME}-source-{version}")
-        with tar_open(source_tar_file, "w:gz") as tar:
-            for filename in filenames:
-                tar.add(filename, arcname=source_prefix / filename, filter=tar_filter)
+            for future in as_completed(futures):
+                try:
+                    # Re-raise any exception from the build
+                    future.result()
+                except BaseException:
+                    # The SDK cannot be completed, so do not start any of the
+                    # builds still waiting for a worker
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+
+        if doc_build is not None:
+            finish_doc_build(doc_build, root_dir)
+            if doc_stamp is not None:
+                doc_build_stamp.write_text(doc_stamp)
+
+        if tool_tests is not None:
+            finish_tool_tests(tool_tests)
+            if tool_stamp is not None:
+                tool_test_stamp.write_text(tool_stamp)
+
+        # Setup the examples
+        for example, example_path in EXAMPLES.items():
+            example_dir = root_dir / "example" / example
+            copy_tree(example_path, example_dir)
+
+        if not args.skip_tar:
+            # At this point we create the SDK tar.gz file
+            build_sdk_tar(root_dir, tar_file, args.compression, total_jobs, tar_stamp)
+        if source_tar is not None:
+            source_tar.result()
+    finally:
+        # If a build failed, stop the work still running in the background
+        # rather than leaving it behind once the script has exited
+        for process in (doc_build, tool_tests):
+            if process is not None and process.poll() is None:
+                process.terminate()
+                process.wait()
+        source_tar_cancelled.set()
+        tar_executor.shutdown(cancel_futures=True)
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@
 This is designed to make it easy to build and run examples during development.
 """
 from argparse import ArgumentParser
-from os import environ, system
+from os import environ, scandir
 from pathlib import Path
 from shutil import rmtree
 from subprocess import run
@@ -18,14 +18,17 @@ BUILD_DIR = CWD / "tmp_build"
 
 def find_releases():
     releases = []
-    for f in (CWD / "release").iterdir():
-        if not f.is_dir():
-            continue
-        if not f.name.startswith("microkit-sdk-"):
-            # All directories in here should match this, but
-            # skip just iun case someone added junk
-            continue
-        releases.append(f)
+    with scandir(CWD / "release") as it:
+        for entry in it:
+            # The directory listing already says which entries are
+            # directories, so no stat is needed
+            if not entry.is_dir():
+                continue
+            if not entry.name.startswith("microkit-sdk-"):
+                # All directories in here should match this, but
+                # skip just iun case someone added junk
+                continue
+            releases.append(Path(entry.path))
 
     def release_sort_key(rel):
         ver_str = rel.name.split("-")[-1]
@@ -77,16 +80,17 @@ def main():
     if not BUILD_DIR.exists():
         BUILD_DIR.mkdir()
 
-    tool_rebuild = f"cd tool/microkit && cargo build --release"
-    r = system(tool_rebuild)
-    assert r == 0
+    tool_rebuild = ["cargo", "build", "--release"]
+    r = run(tool_rebuild, cwd="tool/microkit")
+    if r.returncode != 0:
+        raise Exception(f"Error building tool: cmd={tool_rebuild}")
 
     make_env = environ.copy()
     make_env["BUILD_DIR"] = str(BUILD_DIR.absolute())
     make_env["MICROKIT_BOARD"] = args.board
     make_env["MICROKIT_CONFIG"] = args.config
     make_env["MICROKIT_SDK"] = str(release)
-    make_env["MICROKIT_TOOL"] = Path("tool/microkit/target/release/microkit").absolute()
+    make_env["MICROKIT_TOOL"] = str(Path("tool/microkit/target/release/microkit").absolute())
 
     # Choose the makefile based on the `--example-from-sdk` command line flag
     makefile_directory = (
@@ -97,7 +101,9 @@ def main():
 
     cmd = ["make", "-C", makefile_directory]
 
-    run(cmd, env=make_env)
+    r = run(cmd, env=make_env)
+    if r.returncode != 0:
+        raise Exception(f"Error building example: cmd={cmd}")
 
 
 if __name__ == "__main__":